@@ -1,12 +1,22 @@
 import streamlit as st
-import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import random
+import os
+import time
+import uuid
+from urllib.parse import quote
 from datetime import datetime
 import requests
 from fractions import Fraction  # for simplified fraction display
 
+from figures import percent_bar_figure, grid_figure, pie_figure
+from progress import apply_result
+from problems import WORD_PROBLEM_TOPICS, generate_word_problem
+from worksheets import build_worksheet
+from metrics import ANSWERS, DRX_REQUESTS, DRX_SECONDS, FIGURE_SECONDS, RERUNS, RERUN_SECONDS, start_metrics_server
+from classroom import Classroom
+from session_store import get_store, sync_in, sync_out
+from replay import ReplayLog, log_widget_changes, new_seed, replay_dir, session_rng
+
 # -------------------------------
 # Page configuration
 # -------------------------------
@@ -20,6 +30,14 @@ st.set_page_config(
 # -------------------------------
 # Session state (progress, badges)
 # -------------------------------
+start_metrics_server()  # no-op unless MATHCRAFT_METRICS_PORT is set
+
+# Progress lives in a shared store keyed by ?sid=, so any worker can pick the session up.
+session_store = get_store()
+if "sid" not in st.query_params:
+    st.query_params["sid"] = uuid.uuid4().hex
+sync_in(session_store, st.session_state, st.query_params["sid"])
+
 if "xp" not in st.session_state:
     st.session_state.xp = 0
 if "streak" not in st.session_state:
@@ -29,6 +47,29 @@ if "badges" not in st.session_state:
 if "history" not in st.session_state:
     st.session_state.history = []  # list of dicts: {time, module, prompt, user_answer, correct, feedback, xp}
 
+# -------------------------------
+# Seeded RNG + replay log (opt in with MATHCRAFT_REPLAY_DIR=replays, then `python replay.py replays/<id>.mcr`)
+# -------------------------------
+_rerun_started = time.perf_counter()
+if "rng_seed" not in st.session_state:
+    st.session_state.rng_seed = new_seed()
+if "rng" not in st.session_state:
+    st.session_state.rng = session_rng(st.session_state.rng_seed)
+if "replay_id" not in st.session_state:
+    st.session_state.replay_id = uuid.uuid4().hex
+if "replay_snapshot" not in st.session_state:
+    st.session_state.replay_snapshot = {}
+
+replay_log = None
+if replay_dir():
+    replay_log = ReplayLog(os.path.join(replay_dir(), f"{st.session_state.replay_id}.mcr"), st.session_state.rng_seed)
+    replay_log.rerun()
+    log_widget_changes(replay_log, st.session_state, st.session_state.replay_snapshot)
+
+def log_problem(module, text, answer):
+    if replay_log:
+        replay_log.problem(module, text, answer)
+
 def award_xp(amount, reason, module):
     st.session_state.xp += amount
     st.session_state.history.append({
@@ -50,23 +91,18 @@ def award_xp(amount, reason, module):
         st.session_state.badges.add("Streak Master")
 
 def record_result(module, prompt, user_answer, correct, feedback, xp_gain=0):
-    if correct:
-        st.session_state.streak += 1
-        if xp_gain:
-            st.session_state.xp += xp_gain
-    else:
-        st.session_state.streak = 0
-    st.session_state.history.append({
-        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "module": module,
-        "prompt": prompt,
-        "user_answer": str(user_answer),
-        "correct": bool(correct),
-        "feedback": feedback,
-        "xp": st.session_state.xp
-    })
-    if st.session_state.streak >= 5:
-        st.session_state.badges.add("Streak Master")
+    ANSWERS.inc(module=module, correct="true" if correct else "false")
+    apply_result(st.session_state, module, prompt, user_answer, correct, feedback, xp_gain)
+
+def record_quiz_result(prompt, user_answer, correct, feedback, xp_gain=0):
+    # The quiz re-grades on every rerun: record an answer only when it changes, and pay a
+    # question's XP only the first time it is answered correctly.
+    graded = st.session_state.setdefault("quiz_graded", {})
+    entry = graded.setdefault(prompt, {"answer": None, "earned": False})
+    if entry["answer"] != user_answer:
+        entry["answer"] = user_answer
+        record_result("Quiz", prompt, user_answer, correct, feedback, 0 if entry["earned"] else xp_gain)
+        entry["earned"] = entry["earned"] or bool(correct and xp_gain)
 
 # -------------------------------
 # Custom CSS (playful theme)
@@ -144,11 +180,14 @@ page = st.sidebar.selectbox(
         "🧾 Tax & Tip Receipt Builder",
         "💼 Commission & Simple Interest",
         "🧩 Word Problem Generator",
+        "🖨️ Worksheet Builder",
         "🤖 Design Your Own Percent Problem (Dr. X)",
         "🧠 Quiz: The Percent Power-Up",
+        "👩‍🏫 Classroom Mode (Teacher)",
         "📚 External Resources",
         "📤 Export Progress"
-    ]
+    ],
+    key="nav_page"
 )
 
 # -------------------------------
@@ -174,37 +213,19 @@ def percent_as_simplified_fraction_of_whole(pct: float):
     return frac.numerator, frac.denominator
 
 def draw_percent_bar(pct, color='#ff6b6b'):
-    fig, ax = plt.subplots(figsize=(8, 1))
-    ax.barh([0], [pct], color=color)
-    ax.barh([0], [100 - pct], left=[pct], color='#e0e0e0')
-    ax.set_xlim(0, 100); ax.set_yticks([]); ax.set_xticks([0, 25, 50, 75, 100])
-    ax.text(min(pct/2, 95), 0, f'{pct:.0f}%', ha='center', va='center', color='white', fontsize=16)
-    st.pyplot(fig)
+    start = time.perf_counter()
+    st.pyplot(percent_bar_figure(pct, color))
+    FIGURE_SECONDS.observe(time.perf_counter() - start, kind="bar")
 
 def draw_10x10_grid(pct):
-    filled = int(round(pct))
-    fig, ax = plt.subplots(figsize=(4,4))
-    grid = np.zeros((10,10), dtype=int)
-    idx = 0
-    for r in range(10):
-        for c in range(10):
-            if idx < filled:
-                grid[r, c] = 1
-                idx += 1
-    ax.imshow(grid, cmap='Greys', vmin=0, vmax=1)
-    ax.set_xticks(np.arange(-.5, 10, 1)); ax.set_yticks(np.arange(-.5, 10, 1))
-    ax.set_xticklabels([]); ax.set_yticklabels([])
-    ax.grid(color='black', linestyle='-', linewidth=0.5)
-    ax.set_title(f"{pct:.0f}% shaded")
-    st.pyplot(fig)
+    start = time.perf_counter()
+    st.pyplot(grid_figure(pct))
+    FIGURE_SECONDS.observe(time.perf_counter() - start, kind="grid")
 
 def draw_pie(percent):
-    sizes = [percent, 100 - percent]
-    labels = [f"{percent:.0f}%", ""]
-    fig, ax = plt.subplots(figsize=(3,3))
-    ax.pie(sizes, labels=labels, startangle=90, counterclock=False, autopct=None)
-    ax.axis('equal')
-    st.pyplot(fig)
+    start = time.perf_counter()
+    st.pyplot(pie_figure(percent))
+    FIGURE_SECONDS.observe(time.perf_counter() - start, kind="pie")
 
 def check_numeric_answer(user_value, correct_value, tol=1e-6):
     try:
@@ -214,6 +235,8 @@ def check_numeric_answer(user_value, correct_value, tol=1e-6):
 
 # --- Dr. X LLM Integration (same config you use elsewhere) ---
 def ask_drx(message: str) -> str:
+    start = time.perf_counter()
+    outcome = "ok"
     try:
         response = requests.post(
             "https://ask-drx-730124987572.us-central1.run.app",
@@ -222,13 +245,20 @@ def ask_drx(message: str) -> str:
         )
         if response.status_code == 200:
             return response.json().get("reply", "Sorry, I couldn't process that.")
+        outcome = "http_error"
         return f"I'm having trouble connecting right now. Server responded with status {response.status_code}. Please try again."
     except requests.exceptions.Timeout:
+        outcome = "timeout"
         return "I'm having trouble connecting right now. The request timed out. Please try again."
     except requests.exceptions.ConnectionError:
+        outcome = "connection_error"
         return "I'm having trouble connecting right now. There was a network error. Please check your internet connection and try again."
     except Exception as e:
+        outcome = "error"
         return f"I'm having trouble connecting right now. An unexpected error occurred: {e}. Please try again."
+    finally:
+        DRX_REQUESTS.inc(outcome=outcome)
+        DRX_SECONDS.observe(time.perf_counter() - start)
 
 # -------------------------------
 # Home & overview
@@ -370,10 +400,11 @@ elif page == "✖️ Percent of a Number":
         st.session_state.poa_level = 1  # increases with correct answers
 
     if st.button("New Practice Problem", key="poa_new"):
-        p = random.choice([5,10,15,20,25,30,40,50,60,75,80,90])
-        w = random.randint(20*st.session_state.poa_level, 80*st.session_state.poa_level)
+        p = st.session_state.rng.choice([5,10,15,20,25,30,40,50,60,75,80,90])
+        w = st.session_state.rng.randint(20*st.session_state.poa_level, 80*st.session_state.poa_level)
         st.session_state.poa_problem = (p, w)
         st.session_state.poa_answer = (p/100)*w
+        log_problem("Percent of Number", f"{p}% of {w}", st.session_state.poa_answer)
 
     if "poa_problem" in st.session_state:
         p, w = st.session_state.poa_problem
@@ -510,36 +541,24 @@ elif page == "🧩 Word Problem Generator":
     st.header("🧩 Word Problem Generator")
     st.markdown("Get a fresh real-world percent problem. Enter your answer for instant feedback & XP.")
 
-    topics = ["discount", "tax", "tip", "commission", "percent_of"]
-    topic = st.selectbox("Choose topic", topics, key="wp_topic")
+    topic = st.selectbox("Choose topic", WORD_PROBLEM_TOPICS, key="wp_topic")
 
     if st.button("Generate problem", key="wp_generate"):
-        if topic == "discount":
-            price = random.choice([24.99, 38.50, 59.95, 120.0])
-            disc = random.choice([10, 15, 20, 25, 30, 40])
-            st.session_state.wp_text = f"A hoodie costs ${price:.2f}. It's on sale for {disc}% off. What is the sale price?"
-            st.session_state.wp_answer = price * (1 - disc/100)
-        elif topic == "tax":
-            price = random.choice([14.99, 49.99, 83.75, 230.00])
-            tax = random.choice([5.0, 6.625, 7.0, 8.875])
-            st.session_state.wp_text = f"A gadget costs ${price:.2f}. Sales tax is {tax}%. What is the total cost?"
-            st.session_state.wp_answer = price * (1 + tax/100)
-        elif topic == "tip":
-            bill = random.choice([18.75, 42.10, 63.40, 96.00])
-            tip = random.choice([15, 18, 20, 22])
-            st.session_state.wp_text = f"A restaurant bill is ${bill:.2f}. You tip {tip}%. What total do you pay?"
-            st.session_state.wp_answer = bill * (1 + tip/100)
-        elif topic == "commission":
-            base = random.choice([0, 300, 500])
-            sales = random.choice([1200, 2500, 4800, 7500])
-            rate = random.choice([5, 8, 10, 12])
-            st.session_state.wp_text = f"You earn a base pay of ${base} plus {rate}% of your ${sales} sales. What are your total earnings?"
-            st.session_state.wp_answer = base + (rate/100)*sales
-        else:
-            p = random.choice([5, 10, 12.5, 20, 25, 40, 60, 75, 80])
-            w = random.choice([40, 80, 120, 240, 400])
-            st.session_state.wp_text = f"What is {p}% of {w}?"
-            st.session_state.wp_answer = (p/100)*w
+        problem = generate_word_problem(topic, st.session_state.rng)
+        st.session_state.wp_text = problem["text"]
+        st.session_state.wp_answer = problem["answer"]
+        log_problem("Word Problems", problem["text"], problem["answer"])
+
+    practice_set = st.session_state.get("practice_set", [])
+    practice_index = st.session_state.get("practice_index", 0)
+    if practice_index < len(practice_set):
+        st.caption(f"📋 Your teacher assigned a practice set: {practice_index} of {len(practice_set)} done.")
+        if st.button("Next assigned problem", key="wp_assigned"):
+            problem = practice_set[practice_index]
+            st.session_state.wp_text = problem["text"]
+            st.session_state.wp_answer = problem["answer"]
+            st.session_state.practice_index = practice_index + 1
+            log_problem("Word Problems", problem["text"], problem["answer"])
 
     if "wp_text" in st.session_state:
         st.info(st.session_state.wp_text)
@@ -555,6 +574,33 @@ elif page == "🧩 Word Problem Generator":
                 st.error(f"Not quite. A good estimate is {st.session_state.wp_answer:.2f}. Try another!")
                 record_result("Word Problems", st.session_state.wp_text, usr, False, "Incorrect.", xp_gain=0)
 
+# -------------------------------
+# Worksheet Builder (printable practice sets + answer keys)
+# -------------------------------
+elif page == "🖨️ Worksheet Builder":
+    st.header("🖨️ Worksheet Builder")
+    st.markdown("Build a printable practice set from the Word Problem Generator topics, with a visual for every problem and an answer key at the end.")
+
+    ws_topics = st.multiselect("Topics", WORD_PROBLEM_TOPICS, default=WORD_PROBLEM_TOPICS, key="ws_topics")
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        ws_count = st.number_input("Number of problems", 4, 2000, 20, 4, key="ws_count")
+    with c2:
+        ws_visual = st.radio("Visual", ["grid", "bar"], format_func=lambda v: "10×10 Grid" if v == "grid" else "Percent Bar", key="ws_visual")
+    with c3:
+        ws_format = st.radio("Format", ["html", "pdf"], format_func=str.upper, key="ws_format")
+    ws_title = st.text_input("Worksheet title", value="Percent Practice", key="ws_title")
+
+    if st.button("Build worksheet", key="ws_build"):
+        if ws_topics:
+            with st.spinner("Rendering pages…"):
+                with build_worksheet(ws_topics, int(ws_count), visual=ws_visual, fmt=ws_format, title=ws_title, rng=st.session_state.rng) as doc:
+                    doc_bytes = doc.read()  # download_button needs bytes, not a spooled temp file
+            mime = "text/html" if ws_format == "html" else "application/pdf"
+            st.download_button("Download Worksheet", data=doc_bytes, file_name=f"percent_worksheet.{ws_format}", mime=mime, key="ws_download")
+        else:
+            st.warning("Pick at least one topic.")
+
 # -------------------------------
 # Dr. X: Design Your Own Percent Problem
 # -------------------------------
@@ -688,10 +734,10 @@ elif page == "🧠 Quiz: The Percent Power-Up":
         if q1 == "0.75":
             score += 1
             st.success("Correct! 75 ÷ 100 = 0.75")
-            record_result("Quiz", "75% → decimal", q1, True, "Correct.", xp_gain=6)
+            record_quiz_result("75% → decimal", q1, True, "Correct.", xp_gain=6)
         else:
             st.error("Incorrect. Divide by 100 to convert percent to decimal.")
-            record_result("Quiz", "75% → decimal", q1, False, "Divide by 100.", xp_gain=0)
+            record_quiz_result("75% → decimal", q1, False, "Divide by 100.", xp_gain=0)
 
     st.subheader("2) What is 30% of 200?")
     q2 = st.text_input("Enter a number:", key="qq2")
@@ -699,10 +745,10 @@ elif page == "🧠 Quiz: The Percent Power-Up":
         if check_numeric_answer(q2, 60, tol=1e-6):
             score += 1
             st.success("Correct! 0.30 × 200 = 60")
-            record_result("Quiz", "30% of 200", q2, True, "Correct.", xp_gain=6)
+            record_quiz_result("30% of 200", q2, True, "Correct.", xp_gain=6)
         else:
             st.error("Incorrect. Convert to decimal first (0.30) then multiply by 200.")
-            record_result("Quiz", "30% of 200", q2, False, "Convert then multiply.", xp_gain=0)
+            record_quiz_result("30% of 200", q2, False, "Convert then multiply.", xp_gain=0)
 
     st.subheader("3) A $50 shirt is on sale for $40. What is the percent discount?")
     q3 = st.radio("Choose one:", ["10%", "20%", "25%", "40%"], index=None, key="qq3")
@@ -710,16 +756,72 @@ elif page == "🧠 Quiz: The Percent Power-Up":
         if q3 == "20%":
             score += 1
             st.success("Correct! Change = -$10; (-10/50)×100 = -20% → 20% discount.")
-            record_result("Quiz", "Percent discount from 50→40", q3, True, "Correct.", xp_gain=6)
+            record_quiz_result("Percent discount from 50→40", q3, True, "Correct.", xp_gain=6)
         else:
             st.error("Not quite. Discount% = (Original - Sale)/Original × 100 = (50-40)/50 × 100 = 20%.")
-            record_result("Quiz", "Percent discount from 50→40", q3, False, "Compute change/original.", xp_gain=0)
+            record_quiz_result("Percent discount from 50→40", q3, False, "Compute change/original.", xp_gain=0)
 
     st.markdown("---")
     st.subheader(f"Score: {score}/{total}")
     if score == total:
         st.success("Perfect! +10 XP Bonus")
-        award_xp(10, "Quiz Perfect", "Quiz")
+        graded = st.session_state.setdefault("quiz_graded", {})
+        if not graded.get("__perfect__"):
+            graded["__perfect__"] = True
+            award_xp(10, "Quiz Perfect", "Quiz")
+
+# -------------------------------
+# Classroom Mode (roster import + bulk practice sets)
+# -------------------------------
+elif page == "👩‍🏫 Classroom Mode (Teacher)":
+    st.header("👩‍🏫 Classroom Mode")
+    st.markdown("Import a roster CSV (a **name** column, plus an optional **student_id**). Each student gets their own progress space and a private practice link — share each link only with that student.")
+
+    c1, c2 = st.columns(2)
+    with c1:
+        class_id = st.text_input("Class ID", value="period1", key="cls_id")
+    with c2:
+        roster_file = st.file_uploader("Roster CSV", type=["csv"], key="cls_roster")
+
+    if roster_file is not None and class_id.strip():
+        start = time.perf_counter()
+        try:
+            room = Classroom.from_csv(roster_file.getvalue(), class_id.strip(), session_store, owner=st.query_params["sid"])
+        except ValueError as e:
+            st.error(str(e))
+            room = None
+        if room:
+            st.caption(f"Loaded {len(room.students)} students in {(time.perf_counter() - start) * 1000:.0f} ms.")
+
+            st.markdown("### Assign practice sets")
+            cls_topics = st.multiselect("Topics", WORD_PROBLEM_TOPICS, default=WORD_PROBLEM_TOPICS, key="cls_topics")
+            c3, c4 = st.columns(2)
+            with c3:
+                cls_count = st.number_input("Problems per student", 1, 50, 10, 1, key="cls_count")
+            with c4:
+                cls_seed = st.number_input("Set seed (same seed → same sets)", 0, 2**31 - 1, 1, 1, key="cls_seed")
+            if st.button("Assign to every student", key="cls_assign"):
+                if cls_topics:
+                    room.assign_practice(cls_topics, int(cls_count), int(cls_seed))
+                    st.success(f"Assigned {int(cls_count)} problems to each of {len(room.students)} students.")
+                else:
+                    st.warning("Pick at least one topic.")
+
+            st.markdown("### Simulate a class practice round")
+            cls_rate = st.slider("Share of answers correct (%)", 0, 100, 75, key="cls_rate")
+            if st.button("Run simulation", key="cls_simulate"):
+                start = time.perf_counter()
+                room.simulate(cls_rate / 100, int(cls_seed))
+                st.success(f"Simulated every student's remaining problems in {(time.perf_counter() - start) * 1000:.0f} ms.")
+
+            st.markdown("### Class progress")
+            summary_df = pd.DataFrame(room.summary())
+            if not summary_df.empty:
+                summary_df["Session"] = "?sid=" + summary_df["Session"].map(quote)
+            st.dataframe(summary_df, use_container_width=True)
+            sets_df = pd.DataFrame(room.practice_rows(), columns=["Student ID", "Name", "#", "Problem", "Answer"])
+            st.download_button("Download Practice Sets CSV", data=sets_df.to_csv(index=False).encode("utf-8"),
+                               file_name=f"{class_id.strip()}_practice_sets.csv", mime="text/csv")
 
 # -------------------------------
 # External Resources
@@ -762,3 +864,9 @@ st.markdown("""
     <p>Built by Xavier Honablue M.Ed | MathCraft</p>
 </div>
 """, unsafe_allow_html=True)
+
+sync_out(session_store, st.session_state, st.query_params["sid"])
+RERUNS.inc(page=page)
+RERUN_SECONDS.observe(time.perf_counter() - _rerun_started)
+if replay_log:
+    replay_log.rerun_end((time.perf_counter() - _rerun_started) * 1000)
@@ -0,0 +1,158 @@
+import csv
+import hashlib
+import io
+import random
+import secrets
+import zlib
+
+from problems import generate_word_problem
+from progress import apply_result
+from session_store import decode, encode
+
+# -------------------------------
+# Classroom mode: roster import + per-student progress namespaces
+# -------------------------------
+# Students hold only their ids; progress is decoded from the session store when asked for,
+# and bulk operations work in batches, so memory stays bounded for large rosters.
+BATCH_SIZE = 100
+PROGRESS_DEFAULTS = {"xp": 0, "streak": 0, "badges": set(), "history": [], "practice_set": [], "practice_index": 0}
+
+class Student:
+    __slots__ = ("student_id", "name", "sid", "_store")
+
+    def __init__(self, student_id, name, sid, store):
+        self.student_id, self.name, self.sid, self._store = student_id, name, sid, store
+
+    def load(self, keys=None):
+        """Fetches and decodes only `keys` (all progress when omitted) from the store. Nothing is cached."""
+        keys = keys or list(PROGRESS_DEFAULTS)
+        blobs = self._store.load(self.sid, keys)
+        state = {}
+        for key in keys:
+            default = PROGRESS_DEFAULTS[key]
+            state[key] = decode(blobs[key]) if key in blobs else (default.copy() if hasattr(default, "copy") else default)
+        return state
+
+    @property
+    def history(self):
+        return self.load(["history"])["history"]
+
+    def rng(self, seed):
+        """Per-student RNG derived from the class seed, so a practice set can be regenerated exactly."""
+        return random.Random(zlib.crc32(f"{seed}:{self.student_id}".encode("utf-8")))
+
+class Classroom:
+    """
+    A roster owned by one teacher session. Each student's session id is a random token kept in
+    the class record, so ids can't be guessed from the roster and two teachers reusing a
+    class ID never share students.
+    """
+
+    def __init__(self, class_id, store, owner):
+        self.class_id, self.store = class_id, store
+        # Hash the encoded (owner, class_id) pair so no two different pairs can collide.
+        self.class_sid = "class-" + hashlib.sha256(encode((owner, class_id))).hexdigest()
+        self.students = []
+
+    def _student_tokens(self, student_ids):
+        """Returns {student_id: token}, minting and saving tokens for students new to the class."""
+        blob = self.store.load(self.class_sid).get("tokens")
+        tokens = decode(blob) if blob else {}
+        missing = [sid for sid in student_ids if sid not in tokens]
+        if missing:
+            for student_id in missing:
+                tokens[student_id] = secrets.token_urlsafe(16)
+            self.store.save(self.class_sid, {"tokens": encode(tokens)})
+        return tokens
+
+    @classmethod
+    def from_csv(cls, data, class_id, store, owner):
+        """
+        Builds a classroom from roster CSV text or bytes for the teacher session `owner`.
+        A `name` column is required; `student_id` (or `id`) is optional; missing or blank
+        ids default to the row number (or `row-<n>` if a listed id already uses that number).
+        """
+        if isinstance(data, bytes):
+            data = data.decode("utf-8-sig")
+        reader = csv.reader(io.StringIO(data))
+        header = [h.strip().lower() for h in next(reader, [])]
+        if "name" not in header:
+            raise ValueError("Roster CSV needs a 'name' column.")
+        name_col = header.index("name")
+        id_col = header.index("student_id") if "student_id" in header else header.index("id") if "id" in header else None
+        room, rows, seen = cls(class_id, store, owner), [], set()
+        for row_no, row in enumerate(reader, 1):
+            if not row or not any(cell.strip() for cell in row):
+                continue
+            student_id = row[id_col].strip() if id_col is not None and id_col < len(row) else ""
+            if student_id in seen:
+                raise ValueError(f"Duplicate student id {student_id!r} on row {row_no}.")
+            if student_id:
+                seen.add(student_id)
+            rows.append((row_no, student_id, row[name_col].strip() if name_col < len(row) else ""))
+        # Fill blank ids only once every explicit id is known, so a fallback never takes one.
+        resolved = []
+        for row_no, student_id, name in rows:
+            if not student_id:
+                student_id, n = str(row_no), 1
+                while student_id in seen:
+                    student_id, n = f"row-{row_no}" + (f"-{n}" if n > 1 else ""), n + 1
+                seen.add(student_id)
+            resolved.append((student_id, name or f"Student {student_id}"))
+        rows = resolved
+        tokens = room._student_tokens([student_id for student_id, _ in rows])
+        room.students = [Student(student_id, name, tokens[student_id], store) for student_id, name in rows]
+        return room
+
+    def _batches(self):
+        for start in range(0, len(self.students), BATCH_SIZE):
+            yield self.students[start:start + BATCH_SIZE]
+
+    def assign_practice(self, topics, count, seed):
+        """Generates a fresh practice set for every student and writes them to the store in bulk."""
+        for batch in self._batches():
+            writes = {}
+            for student in batch:
+                rng = student.rng(seed)
+                problems = [generate_word_problem(rng.choice(topics), rng) for _ in range(count)]
+                writes[student.sid] = {"practice_set": encode(problems), "practice_index": encode(0)}
+            self.store.save_many(writes)
+
+    def simulate(self, correct_rate, seed):
+        """
+        Plays through every student's remaining practice problems, answering correctly with
+        probability `correct_rate`, and records the results as if each student had done it.
+        """
+        for batch in self._batches():
+            writes = {}
+            for student in batch:
+                state = student.load()
+                rng = random.Random(zlib.crc32(f"sim:{seed}:{student.student_id}".encode("utf-8")))
+                for prob in state["practice_set"][state["practice_index"]:]:
+                    correct = rng.random() < correct_rate
+                    answer = f"{prob['answer']:.2f}" if correct else ""
+                    apply_result(state, "Classroom Practice", prob["text"], answer, correct,
+                                 "Correct." if correct else "Incorrect.", xp_gain=12 if correct else 0)
+                state["practice_index"] = len(state["practice_set"])
+                writes[student.sid] = {k: encode(state[k]) for k in ("xp", "streak", "badges", "history", "practice_index")}
+            self.store.save_many(writes)
+
+    def summary(self):
+        """Yields one row per student without fetching their histories from the store."""
+        for student in self.students:
+            state = student.load(["xp", "streak", "badges", "practice_set", "practice_index"])
+            yield {
+                "Student ID": student.student_id,
+                "Name": student.name,
+                "XP": state["xp"],
+                "Streak": state["streak"],
+                "Badges": ", ".join(sorted(state["badges"])),
+                "Done": f"{state['practice_index']}/{len(state['practice_set'])}",
+                "Session": student.sid,
+            }
+
+    def practice_rows(self):
+        """Yields (student id, name, number, problem, answer) for every assigned problem."""
+        for student in self.students:
+            for n, prob in enumerate(student.load(["practice_set"])["practice_set"], 1):
+                yield student.student_id, student.name, n, prob["text"], round(prob["answer"], 2)
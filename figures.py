@@ -0,0 +1,59 @@
+import io
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+
+# -------------------------------
+# Figure builders (shared by the app pages and the worksheet renderer)
+# -------------------------------
+def percent_bar_figure(pct, color='#ff6b6b'):
+    fig, ax = plt.subplots(figsize=(8, 1))
+    ax.barh([0], [pct], color=color)
+    ax.barh([0], [100 - pct], left=[pct], color='#e0e0e0')
+    ax.set_xlim(0, 100); ax.set_yticks([]); ax.set_xticks([0, 25, 50, 75, 100])
+    ax.text(min(pct/2, 95), 0, f'{pct:.0f}%', ha='center', va='center', color='white', fontsize=16)
+    return fig
+
+def grid_figure(pct):
+    filled = int(round(pct))
+    fig, ax = plt.subplots(figsize=(4,4))
+    grid = np.zeros((10,10), dtype=int)
+    idx = 0
+    for r in range(10):
+        for c in range(10):
+            if idx < filled:
+                grid[r, c] = 1
+                idx += 1
+    ax.imshow(grid, cmap='Greys', vmin=0, vmax=1)
+    ax.set_xticks(np.arange(-.5, 10, 1)); ax.set_yticks(np.arange(-.5, 10, 1))
+    ax.set_xticklabels([]); ax.set_yticklabels([])
+    ax.grid(color='black', linestyle='-', linewidth=0.5)
+    ax.set_title(f"{pct:.0f}% shaded")
+    return fig
+
+def pie_figure(percent):
+    sizes = [percent, 100 - percent]
+    labels = [f"{percent:.0f}%", ""]
+    fig, ax = plt.subplots(figsize=(3,3))
+    ax.pie(sizes, labels=labels, startangle=90, counterclock=False, autopct=None)
+    ax.axis('equal')
+    return fig
+
+FIGURE_BUILDERS = {"bar": percent_bar_figure, "grid": grid_figure, "pie": pie_figure}
+
+def render_figure_png(kind, pct, dpi=80):
+    """
+    Renders one figure to PNG bytes and closes it. Lives at module level (not in app.py)
+    so process-pool workers can import and pickle it.
+    """
+    fig = FIGURE_BUILDERS[kind](pct)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
+def render_figure_timed(kind, pct):
+    """Returns (PNG bytes, seconds spent rendering), so a pool's parent can record the timing."""
+    start = time.perf_counter()
+    png = render_figure_png(kind, pct)
+    return png, time.perf_counter() - start
@@ -0,0 +1,191 @@
+import os
+import threading
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# -------------------------------
+# Low-overhead metrics with Prometheus text exposition
+# -------------------------------
+# Every thread writes only to its own shard, so recording never takes a lock.
+# Shards are summed at scrape time; shards of finished threads are folded into
+# a retired total so per-rerun script threads don't pile up.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self._local = threading.local()
+        self._shards = {}   # thread -> {(name, labels): value}
+        self._retired = {}
+        self._lock = threading.Lock()  # only taken when a thread first records, and when scraping
+
+    def shard(self):
+        data = getattr(self._local, "data", None)
+        if data is None:
+            data = self._local.data = {}
+            with self._lock:
+                self._retire_dead()  # keeps the shard count bounded by live threads, scraped or not
+                self._shards[threading.current_thread()] = data
+        return data
+
+    def _retire_dead(self):
+        # Caller holds self._lock.
+        for thread in [t for t in self._shards if not t.is_alive()]:
+            _merge(self._retired, self._shards.pop(thread))
+
+    def _collect(self):
+        totals = {}
+        with self._lock:
+            self._retire_dead()
+            _merge(totals, self._retired)
+            for data in self._shards.values():
+                _merge(totals, data)
+        return totals
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        totals = self._collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for (name, labels), value in sorted(totals.items(), key=lambda kv: kv[0][1]):
+                if name == metric.name:
+                    lines.extend(metric.samples(labels, value))
+        return "\n".join(lines) + "\n"
+
+def _merge(into, data):
+    for key, value in list(data.items()):
+        if isinstance(value, list):
+            acc = into.setdefault(key, [0] * len(value))
+            for i, v in enumerate(value):
+                acc[i] += v
+        else:
+            into[key] = into.get(key, 0) + value
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _format_value(v):
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, registry=None):
+        self.name, self.help = name, help
+        self.registry = registry or REGISTRY
+        self.registry.metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        data = self.registry.shard()
+        key = (self.name, tuple(sorted(labels.items())))
+        data[key] = data.get(key, 0) + amount
+
+    def samples(self, labels, value):
+        return [f"{self.name}{_format_labels(labels)} {_format_value(value)}"]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS, registry=None):
+        self.name, self.help = name, help
+        self.buckets = tuple(sorted(buckets))
+        self.registry = registry or REGISTRY
+        self.registry.metrics.append(self)
+
+    def observe(self, value, **labels):
+        data = self.registry.shard()
+        key = (self.name, tuple(sorted(labels.items())))
+        # layout: one count per bucket (non-cumulative), then +Inf overflow, sum, count
+        acc = data.get(key)
+        if acc is None:
+            acc = data[key] = [0] * (len(self.buckets) + 3)
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        acc[i] += 1
+        acc[-2] += value
+        acc[-1] += 1
+
+    def samples(self, labels, value):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), value):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _format_value(bound)
+            lines.append(f"{self.name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(value[-2])}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {value[-1]}")
+        return lines
+
+REGISTRY = Registry()
+
+# -------------------------------
+# App metrics
+# -------------------------------
+RERUNS = Counter("mathcraft_reruns_total", "Script reruns by page.")
+RERUN_SECONDS = Histogram("mathcraft_rerun_seconds", "Wall time of a full script rerun.")
+ANSWERS = Counter("mathcraft_answers_total", "Graded answers by module and correctness.")
+DRX_REQUESTS = Counter("mathcraft_drx_requests_total", "Dr. X requests by outcome (ok, http_error, timeout, connection_error, error).")
+DRX_SECONDS = Histogram("mathcraft_drx_request_seconds", "Dr. X request latency, including failures.")
+FIGURE_SECONDS = Histogram("mathcraft_figure_render_seconds", "Time to build and draw a figure, by kind.")
+
+# -------------------------------
+# Side-port exporter
+# -------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep scrapes out of the app log
+
+_server = None
+_server_failed = False
+_server_lock = threading.Lock()
+
+def start_metrics_server(port=None, host="0.0.0.0"):
+    """
+    Serves /metrics from a daemon thread. Safe to call on every rerun; the server is started
+    once per process. Returns the server, or None when no port is configured or the port could
+    not be bound (warned about once and not retried).
+
+    Counters are per process, so each worker needs its own port and its own scrape target:
+    by default the port is MATHCRAFT_METRICS_PORT + MATHCRAFT_WORKER_INDEX (0 when unset).
+    Workers on one host that share an index collide, and all but the first go unexported.
+    """
+    global _server, _server_failed
+    if port is None:
+        base = os.environ.get("MATHCRAFT_METRICS_PORT")
+        if base in (None, ""):
+            return None
+        port = int(base) + int(os.environ.get("MATHCRAFT_WORKER_INDEX") or 0)
+    with _server_lock:
+        if _server is None and not _server_failed:
+            try:
+                _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            except OSError as e:
+                _server_failed = True
+                warnings.warn(
+                    f"Metrics exporter disabled: could not bind {host}:{port} ({e}). "
+                    "Give each worker on this host its own MATHCRAFT_WORKER_INDEX."
+                )
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return _server
@@ -0,0 +1,40 @@
+import random
+
+# -------------------------------
+# Word problem generation (used by the Word Problem Generator and worksheets)
+# -------------------------------
+WORD_PROBLEM_TOPICS = ["discount", "tax", "tip", "commission", "percent_of"]
+
+def generate_word_problem(topic, rng=random):
+    """
+    Returns a dict {topic, text, answer, pct} for one problem. `pct` is the percent the
+    problem is about, used to pick its 10×10 grid or bar visual. `rng` is anything with
+    choice() (the random module by default).
+    """
+    if topic == "discount":
+        price = rng.choice([24.99, 38.50, 59.95, 120.0])
+        disc = rng.choice([10, 15, 20, 25, 30, 40])
+        text = f"A hoodie costs ${price:.2f}. It's on sale for {disc}% off. What is the sale price?"
+        answer, pct = price * (1 - disc/100), disc
+    elif topic == "tax":
+        price = rng.choice([14.99, 49.99, 83.75, 230.00])
+        tax = rng.choice([5.0, 6.625, 7.0, 8.875])
+        text = f"A gadget costs ${price:.2f}. Sales tax is {tax}%. What is the total cost?"
+        answer, pct = price * (1 + tax/100), tax
+    elif topic == "tip":
+        bill = rng.choice([18.75, 42.10, 63.40, 96.00])
+        tip = rng.choice([15, 18, 20, 22])
+        text = f"A restaurant bill is ${bill:.2f}. You tip {tip}%. What total do you pay?"
+        answer, pct = bill * (1 + tip/100), tip
+    elif topic == "commission":
+        base = rng.choice([0, 300, 500])
+        sales = rng.choice([1200, 2500, 4800, 7500])
+        rate = rng.choice([5, 8, 10, 12])
+        text = f"You earn a base pay of ${base} plus {rate}% of your ${sales} sales. What are your total earnings?"
+        answer, pct = base + (rate/100)*sales, rate
+    else:
+        p = rng.choice([5, 10, 12.5, 20, 25, 40, 60, 75, 80])
+        w = rng.choice([40, 80, 120, 240, 400])
+        text = f"What is {p}% of {w}?"
+        answer, pct = (p/100)*w, p
+    return {"topic": topic, "text": text, "answer": answer, "pct": pct}
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+# -------------------------------
+# Progress updates on any session-like mapping (st.session_state or a plain dict)
+# -------------------------------
+def apply_result(state, module, prompt, user_answer, correct, feedback, xp_gain=0):
+    if correct:
+        state["streak"] += 1
+        if xp_gain:
+            state["xp"] += xp_gain
+    else:
+        state["streak"] = 0
+    state["history"].append({
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "module": module,
+        "prompt": prompt,
+        "user_answer": str(user_answer),
+        "correct": bool(correct),
+        "feedback": feedback,
+        "xp": state["xp"]
+    })
+    if state["streak"] >= 5:
+        state["badges"].add("Streak Master")
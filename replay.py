@@ -0,0 +1,244 @@
+import argparse
+import os
+import random
+import secrets
+import struct
+import tempfile
+import time
+
+from session_store import PERSISTED_KEYS
+
+# -------------------------------
+# Seeded per-session RNG + compact binary replay log
+# -------------------------------
+# Log layout: b"MCRL", version (u8), seed (u32), then records of
+#   type (u8) + payload. Strings and lists carry a u32 length prefix.
+MAGIC = b"MCRL"
+VERSION = 2
+RERUN, WIDGET, PROBLEM, RERUN_END = 1, 2, 3, 4
+
+def replay_dir():
+    """
+    Directory for session logs, or "" (the default) to disable logging. Logs hold free-text
+    widget values, so only turn this on where you want to debug sessions. Read on every call
+    so a replay can redirect it.
+    """
+    return os.environ.get("MATHCRAFT_REPLAY_DIR", "")
+
+# Session keys that hold app state rather than widget values; never logged as widget events.
+APP_STATE_KEYS = set(PERSISTED_KEYS) | {"replay_snapshot", "_store_snapshot", "_store_version"}
+
+def new_seed():
+    return secrets.randbits(32)
+
+def session_rng(seed):
+    return random.Random(seed)
+
+def _pack_str(s):
+    b = s.encode("utf-8")
+    return struct.pack("<I", len(b)) + b
+
+def _pack_value(v):
+    if v is None:
+        return b"\x00"
+    if isinstance(v, bool):
+        return b"\x02" if v else b"\x01"
+    if isinstance(v, int):
+        return b"\x03" + struct.pack("<q", v)
+    if isinstance(v, float):
+        return b"\x04" + struct.pack("<d", v)
+    if isinstance(v, str):
+        return b"\x05" + _pack_str(v)
+    return b"\x06" + struct.pack("<I", len(v)) + b"".join(_pack_value(x) for x in v)
+
+def is_loggable(v):
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return True
+    return isinstance(v, (list, tuple)) and all(is_loggable(x) for x in v)
+
+class ReplayLog:
+    """Append-only replay log for one session. Each write opens the file, so nothing is held open across reruns."""
+
+    def __init__(self, path, seed):
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(MAGIC + struct.pack("<BI", VERSION, seed))
+
+    def _append(self, rec_type, payload=b""):
+        with open(self.path, "ab") as f:
+            f.write(struct.pack("<B", rec_type) + payload)
+
+    def rerun(self):
+        self._append(RERUN, struct.pack("<d", time.time()))
+
+    def widget(self, key, value):
+        self._append(WIDGET, _pack_str(key) + _pack_value(value))
+
+    def problem(self, module, text, answer):
+        self._append(PROBLEM, _pack_str(module) + _pack_str(text) + struct.pack("<d", answer))
+
+    def rerun_end(self, elapsed_ms):
+        self._append(RERUN_END, struct.pack("<f", elapsed_ms))
+
+def log_widget_changes(log, state, snapshot):
+    """Logs every keyed widget value that differs from `snapshot` and updates the snapshot in place."""
+    for key in list(state.keys()):
+        if key in APP_STATE_KEYS:
+            continue
+        value = state[key]
+        if not is_loggable(value):
+            continue
+        if isinstance(value, tuple):
+            value = list(value)
+        if snapshot.get(key, object()) != value:
+            snapshot[key] = value
+            log.widget(key, value)
+        if value is True:
+            # A button stays True across back-to-back clicks, so forget it and log the next click too.
+            snapshot.pop(key, None)
+
+# -------------------------------
+# Reading logs
+# -------------------------------
+class _Reader:
+    def __init__(self, data):
+        self.data, self.pos = data, 0
+
+    def take(self, fmt):
+        vals = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return vals[0] if len(vals) == 1 else vals
+
+    def string(self):
+        n = self.take("<I")
+        s = self.data[self.pos:self.pos + n].decode("utf-8")
+        self.pos += n
+        return s
+
+    def value(self):
+        tag = self.take("<B")
+        if tag == 0: return None
+        if tag == 1: return False
+        if tag == 2: return True
+        if tag == 3: return self.take("<q")
+        if tag == 4: return self.take("<d")
+        if tag == 5: return self.string()
+        return [self.value() for _ in range(self.take("<I"))]
+
+def read_log(path):
+    """
+    Returns (seed, reruns) where each rerun is a dict
+    {started, changes: [(key, value)], problems: [(module, text, answer)], elapsed_ms}.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != MAGIC:
+        raise ValueError(f"{path} is not a MathCraft replay log")
+    r = _Reader(data)
+    r.pos = 4
+    version, seed = r.take("<BI")
+    if version != VERSION:
+        raise ValueError(f"Unsupported replay log version {version}")
+    reruns = []
+    while r.pos < len(data):
+        rec_type = r.take("<B")
+        if rec_type == RERUN:
+            reruns.append({"started": r.take("<d"), "changes": [], "problems": [], "elapsed_ms": None})
+        elif rec_type == WIDGET:
+            reruns[-1]["changes"].append((r.string(), r.value()))
+        elif rec_type == PROBLEM:
+            reruns[-1]["problems"].append((r.string(), r.string(), r.take("<d")))
+        elif rec_type == RERUN_END:
+            reruns[-1]["elapsed_ms"] = r.take("<f")
+        else:
+            raise ValueError(f"Unknown record type {rec_type} at byte {r.pos - 1}")
+    return seed, reruns
+
+# -------------------------------
+# Headless replay
+# -------------------------------
+WIDGET_TYPES = ["button", "selectbox", "multiselect", "radio", "slider", "number_input", "text_input", "text_area"]
+
+def _find_widget(at, key):
+    for kind in WIDGET_TYPES:
+        try:
+            return kind, getattr(at, kind)(key=key)
+        except KeyError:
+            continue
+    return None, None
+
+class _StubResponse:
+    status_code = 200
+
+    def json(self):
+        return {"reply": "(Dr. X is stubbed out during replay.)"}
+
+def replay_session(path, app_path=None, timeout=60):
+    """
+    Re-executes a logged session with streamlit's AppTest using the recorded seed and widget
+    events. Returns one row per rerun: recorded vs replayed time and whether the generated
+    problems matched. Dr. X is stubbed, so replayed clicks never send a student's logged
+    text to the live service.
+    """
+    from unittest import mock
+    from streamlit.testing.v1 import AppTest
+
+    seed, reruns = read_log(path)
+    previous_dir = os.environ.get("MATHCRAFT_REPLAY_DIR")
+    try:
+        with tempfile.TemporaryDirectory() as tmp, mock.patch("requests.post", return_value=_StubResponse()):
+            os.environ["MATHCRAFT_REPLAY_DIR"] = tmp  # the replayed run logs here, not over the original
+            at = AppTest.from_file(os.path.abspath(app_path or os.path.join(os.path.dirname(__file__), "app.py")), default_timeout=timeout)
+            at.session_state["rng_seed"] = seed
+            rows = []
+            for i, rerun in enumerate(reruns):
+                for key, value in rerun["changes"]:
+                    kind, widget = _find_widget(at, key) if i else (None, None)
+                    if kind == "button":
+                        if value:
+                            widget.click()
+                    elif widget is not None:
+                        widget.set_value(value)
+                    else:
+                        at.session_state[key] = value
+                start = time.perf_counter()
+                at.run()
+                rows.append({
+                    "rerun": i,
+                    "recorded_ms": rerun["elapsed_ms"],
+                    "replayed_ms": (time.perf_counter() - start) * 1000,
+                    "exception": bool(at.exception),
+                })
+            replay_id = at.session_state["replay_id"]
+            _, replayed = read_log(os.path.join(tmp, f"{replay_id}.mcr"))
+    finally:
+        if previous_dir is None:
+            os.environ.pop("MATHCRAFT_REPLAY_DIR", None)
+        else:
+            os.environ["MATHCRAFT_REPLAY_DIR"] = previous_dir
+    for row, original, again in zip(rows, reruns, replayed):
+        row["problems_match"] = original["problems"] == again["problems"]
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a MathCraft session log headlessly and time each rerun.")
+    parser.add_argument("log", help="path to a .mcr replay log")
+    parser.add_argument("--app", default=None, help="streamlit script to run (default: app.py next to this file)")
+    parser.add_argument("--timeout", type=float, default=60, help="per-rerun timeout in seconds")
+    args = parser.parse_args(argv)
+
+    rows = replay_session(args.log, args.app, args.timeout)
+    print(f"{'rerun':>5}  {'recorded ms':>11}  {'replayed ms':>11}  problems")
+    for row in rows:
+        recorded = "-" if row["recorded_ms"] is None else f"{row['recorded_ms']:.1f}"
+        status = "ok" if row["problems_match"] else "MISMATCH"
+        if row["exception"]:
+            status += " (exception)"
+        print(f"{row['rerun']:>5}  {recorded:>11}  {row['replayed_ms']:>11.1f}  {status}")
+    total = sum(r["replayed_ms"] for r in rows)
+    print(f"{len(rows)} reruns replayed in {total:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import os
+import random
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+# -------------------------------
+# Externalized session state (memory / SQLite / Redis backends)
+# -------------------------------
+# Only these keys are shared between workers; widget values stay local to the session.
+PERSISTED_KEYS = [
+    "xp", "streak", "badges", "history", "poa_level", "poa_problem", "poa_answer",
+    "wp_text", "wp_answer", "drx_chat", "rng_seed", "rng", "replay_id",
+    "practice_set", "practice_index", "quiz_graded",
+]
+
+SESSION_TTL_SECONDS = 4 * 60 * 60  # MemoryStore drops sessions idle this long
+
+# Keys whose live objects need converting to/from plain data before encoding.
+EXPORTERS = {"rng": lambda rng: rng.getstate()}
+IMPORTERS = {"rng": lambda state: _restore_rng(state)}
+
+def _restore_rng(state):
+    rng = random.Random()
+    rng.setstate((state[0], tuple(state[1]), state[2]))
+    return rng
+
+# -------------------------------
+# Compact struct codec
+# -------------------------------
+def encode(value):
+    out = bytearray()
+    _encode_into(value, out)
+    return bytes(out)
+
+def _encode_into(v, out):
+    if v is None:
+        out += b"N"
+    elif v is True:
+        out += b"T"
+    elif v is False:
+        out += b"F"
+    elif isinstance(v, int):
+        out += b"i" + struct.pack("<q", v)
+    elif isinstance(v, float):
+        out += b"d" + struct.pack("<d", v)
+    elif isinstance(v, str):
+        b = v.encode("utf-8")
+        out += b"s" + struct.pack("<I", len(b)) + b
+    elif isinstance(v, dict):
+        out += b"m" + struct.pack("<I", len(v))
+        for k, x in v.items():
+            _encode_into(k, out); _encode_into(x, out)
+    elif isinstance(v, (list, tuple, set, frozenset)):
+        tag = b"l" if isinstance(v, list) else b"t" if isinstance(v, tuple) else b"S"
+        items = sorted(v) if tag == b"S" else v  # sets sort so equal sets encode identically
+        out += tag + struct.pack("<I", len(v))
+        for x in items:
+            _encode_into(x, out)
+    else:
+        raise TypeError(f"Cannot store {type(v).__name__} in the session store")
+
+def decode(data):
+    value, _ = _decode_at(data, 0)
+    return value
+
+def _decode_at(data, pos):
+    tag = data[pos:pos + 1]; pos += 1
+    if tag == b"N": return None, pos
+    if tag == b"T": return True, pos
+    if tag == b"F": return False, pos
+    if tag == b"i": return struct.unpack_from("<q", data, pos)[0], pos + 8
+    if tag == b"d": return struct.unpack_from("<d", data, pos)[0], pos + 8
+    (n,) = struct.unpack_from("<I", data, pos); pos += 4
+    if tag == b"s":
+        return data[pos:pos + n].decode("utf-8"), pos + n
+    if tag == b"m":
+        d = {}
+        for _ in range(n):
+            k, pos = _decode_at(data, pos)
+            d[k], pos = _decode_at(data, pos)
+        return d, pos
+    items = []
+    for _ in range(n):
+        x, pos = _decode_at(data, pos)
+        items.append(x)
+    if tag == b"t": return tuple(items), pos
+    if tag == b"S": return set(items), pos
+    return items, pos
+
+# -------------------------------
+# Backends: version(sid) -> int, load(sid, keys=None) -> {key: bytes} (only `keys` when given), save(sid, {key: bytes}) -> new version,
+# save_many({sid: {key: bytes}}) for bulk writes
+# -------------------------------
+class MemoryStore:
+    """
+    Process-local default. Behaves like plain st.session_state but through the same interface.
+    Streamlit frees session_state when a tab closes but nothing tells the store, so sessions
+    untouched for `ttl` seconds are evicted, oldest first.
+    """
+
+    def __init__(self, ttl=SESSION_TTL_SECONDS, clock=time.monotonic):
+        self.ttl, self._clock = ttl, clock
+        self._data, self._versions = {}, {}
+        self._touched = OrderedDict()  # sid -> last use, least recently used first
+        self._lock = threading.Lock()
+
+    def _touch(self, sid):
+        # Caller holds self._lock.
+        now = self._clock()
+        self._touched[sid] = now
+        self._touched.move_to_end(sid)
+        while self._touched:
+            oldest, last_used = next(iter(self._touched.items()))
+            if now - last_used < self.ttl:
+                break
+            del self._touched[oldest]
+            self._data.pop(oldest, None)
+            self._versions.pop(oldest, None)
+
+    def version(self, sid):
+        with self._lock:
+            if sid in self._versions:
+                self._touch(sid)
+            return self._versions.get(sid, 0)
+
+    def load(self, sid, keys=None):
+        with self._lock:
+            if sid in self._data:
+                self._touch(sid)
+            blobs = self._data.get(sid, {})
+            if keys is None:
+                return dict(blobs)
+            return {k: blobs[k] for k in keys if k in blobs}
+
+    def save(self, sid, changes):
+        with self._lock:
+            self._data.setdefault(sid, {}).update(changes)
+            self._versions[sid] = self._versions.get(sid, 0) + 1
+            self._touch(sid)
+            return self._versions[sid]
+
+    def save_many(self, batch):
+        for sid, changes in batch.items():
+            self.save(sid, changes)
+
+class SQLiteStore:
+    """
+    Shared local-file store; every worker on the machine opens the same database. Streamlit runs
+    each rerun on a fresh thread, so one connection per process is shared behind a lock rather
+    than opened per thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS session_state (sid TEXT, key TEXT, value BLOB, PRIMARY KEY (sid, key))")
+            self._db.execute("CREATE TABLE IF NOT EXISTS session_version (sid TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+
+    def version(self, sid):
+        with self._lock:
+            row = self._db.execute("SELECT version FROM session_version WHERE sid = ?", (sid,)).fetchone()
+        return row[0] if row else 0
+
+    def load(self, sid, keys=None):
+        query, params = "SELECT key, value FROM session_state WHERE sid = ?", [sid]
+        if keys is not None:
+            keys = list(keys)
+            query += f" AND key IN ({', '.join('?' * len(keys))})"
+            params += keys
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return {k: bytes(v) for k, v in rows}
+
+    def save(self, sid, changes):
+        with self._lock, self._db as conn:
+            conn.executemany(
+                "INSERT INTO session_state (sid, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (sid, key) DO UPDATE SET value = excluded.value",
+                [(sid, k, v) for k, v in changes.items()],
+            )
+            conn.execute(
+                "INSERT INTO session_version (sid, version) VALUES (?, 1) "
+                "ON CONFLICT (sid) DO UPDATE SET version = version + 1", (sid,)
+            )
+            return conn.execute("SELECT version FROM session_version WHERE sid = ?", (sid,)).fetchone()[0]
+
+    def save_many(self, batch):
+        """Writes many sessions in a single transaction."""
+        with self._lock, self._db as conn:
+            conn.executemany(
+                "INSERT INTO session_state (sid, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (sid, key) DO UPDATE SET value = excluded.value",
+                [(sid, k, v) for sid, changes in batch.items() for k, v in changes.items()],
+            )
+            conn.executemany(
+                "INSERT INTO session_version (sid, version) VALUES (?, 1) "
+                "ON CONFLICT (sid) DO UPDATE SET version = version + 1",
+                [(sid,) for sid in batch],
+            )
+
+class RedisStore:
+    """
+    Works with any client exposing redis-py's hgetall/hset/get/incr
+    (redis.Redis, or an in-process stand-in for testing).
+    """
+
+    def __init__(self, client, prefix="mathcraft:"):
+        self.client, self.prefix = client, prefix
+
+    def version(self, sid):
+        return int(self.client.get(f"{self.prefix}{sid}:version") or 0)
+
+    def load(self, sid, keys=None):
+        if keys is None:
+            return {k.decode() if isinstance(k, bytes) else k: v for k, v in self.client.hgetall(f"{self.prefix}{sid}").items()}
+        keys = list(keys)
+        values = self.client.hmget(f"{self.prefix}{sid}", keys) if keys else []
+        return {k: v for k, v in zip(keys, values) if v is not None}
+
+    def save(self, sid, changes):
+        self.client.hset(f"{self.prefix}{sid}", mapping=changes)
+        return self.client.incr(f"{self.prefix}{sid}:version")
+
+    def save_many(self, batch):
+        pipe = self.client.pipeline() if hasattr(self.client, "pipeline") else self.client
+        for sid, changes in batch.items():
+            pipe.hset(f"{self.prefix}{sid}", mapping=changes)
+            pipe.incr(f"{self.prefix}{sid}:version")
+        if pipe is not self.client:
+            pipe.execute()
+
+def store_from_url(url):
+    """memory:// (or empty), sqlite:///path/to/db, or redis://host:port/db."""
+    if not url or url.startswith("memory:"):
+        return MemoryStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    if url.startswith("redis://"):
+        import redis  # optional; only needed for the Redis backend
+        return RedisStore(redis.Redis.from_url(url))
+    raise ValueError(f"Unknown session store URL: {url}")
+
+_store = None
+
+def get_store():
+    """Process-wide store chosen by MATHCRAFT_SESSION_STORE (defaults to in-memory)."""
+    global _store
+    if _store is None:
+        _store = store_from_url(os.environ.get("MATHCRAFT_SESSION_STORE", ""))
+    return _store
+
+# -------------------------------
+# Syncing st.session_state with the store
+# -------------------------------
+def sync_in(store, state, sid):
+    """Loads the shared state into `state` unless this worker already holds the latest version."""
+    version = store.version(sid)
+    if state.get("_store_version") == version:
+        return
+    blobs = store.load(sid)
+    for key, blob in blobs.items():
+        value = decode(blob)
+        state[key] = IMPORTERS[key](value) if key in IMPORTERS else value
+    state["_store_snapshot"] = blobs
+    state["_store_version"] = version
+
+def sync_out(store, state, sid):
+    """Writes only the persisted keys whose encoded value changed during this rerun."""
+    snapshot = state.get("_store_snapshot", {})
+    dirty = {}
+    for key in PERSISTED_KEYS:
+        if key not in state:
+            continue
+        value = state[key]
+        blob = encode(EXPORTERS[key](value) if key in EXPORTERS else value)
+        if snapshot.get(key) != blob:
+            dirty[key] = blob
+    if dirty:
+        state["_store_version"] = store.save(sid, dirty)
+        state["_store_snapshot"] = {**snapshot, **dirty}
@@ -0,0 +1,124 @@
+import time
+
+import pytest
+
+from classroom import Classroom
+from session_store import MemoryStore, SQLiteStore
+
+
+def test_blank_ids_fall_back_to_row_number():
+    room = Classroom.from_csv("student_id,name\n,Ada\n,Ben\n7,Cy\n", "period1", MemoryStore(), owner="teacher")
+    assert [s.student_id for s in room.students] == ["1", "2", "7"]
+
+
+def test_blank_id_fallbacks_never_collide_with_listed_ids():
+    roster = "student_id,name\n5,Ada\n,Ben\n,Cy\nrow-3,Di\n2,Eve\n3,Fay\n"
+    room = Classroom.from_csv(roster, "period1", MemoryStore(), owner="teacher")
+    assert [s.student_id for s in room.students] == ["5", "row-2", "row-3-2", "row-3", "2", "3"]
+
+
+def test_duplicate_ids_are_rejected():
+    with pytest.raises(ValueError, match="Duplicate student id"):
+        Classroom.from_csv("id,name\n4,Ada\n4,Ben\n", "period1", MemoryStore(), owner="teacher")
+
+
+def test_missing_name_column_is_rejected():
+    with pytest.raises(ValueError, match="'name' column"):
+        Classroom.from_csv("id,first\n1,Ada\n", "period1", MemoryStore(), owner="teacher")
+
+
+def test_session_ids_are_random_stable_and_per_teacher():
+    store = MemoryStore()
+    roster = "student_id,name\n1,Ada\n2,Ben\n"
+    first = Classroom.from_csv(roster, "period1", store, owner="teacher-a")
+    again = Classroom.from_csv(roster, "period1", store, owner="teacher-a")
+    other = Classroom.from_csv(roster, "period1", store, owner="teacher-b")
+
+    sids = [s.sid for s in first.students]
+    assert all("period1" not in sid and len(sid) >= 20 for sid in sids)
+    assert sids == [s.sid for s in again.students]  # re-importing keeps the links
+    assert not set(sids) & {s.sid for s in other.students}
+
+
+def test_class_namespace_is_unambiguous():
+    store = MemoryStore()
+    assert Classroom("b-1", store, owner="a").class_sid != Classroom("1", store, owner="a-b").class_sid
+
+
+ROSTER = "student_id,name\n" + "".join(f"{i},Student {i}\n" for i in range(1, 6))
+
+
+def _room(store=None, owner="teacher"):
+    return Classroom.from_csv(ROSTER, "period1", store or MemoryStore(), owner=owner)
+
+
+def _sets(room):
+    return {s.student_id: s.load(["practice_set"])["practice_set"] for s in room.students}
+
+
+def test_assign_practice_is_seeded_per_student():
+    first, second = _room(), _room()
+    first.assign_practice(["tax", "tip", "discount"], 8, seed=11)
+    second.assign_practice(["tax", "tip", "discount"], 8, seed=11)
+
+    sets = _sets(first)
+    assert sets == _sets(second)  # same seed, same sets
+    assert all(len(problems) == 8 for problems in sets.values())
+    assert len({tuple(p["text"] for p in problems) for problems in sets.values()}) == len(sets)
+
+    second.assign_practice(["tax", "tip", "discount"], 8, seed=12)
+    assert _sets(second) != sets
+
+
+def test_simulate_plays_remaining_problems():
+    room = _room()
+    room.assign_practice(["percent_of"], 6, seed=1)
+    room.simulate(1.0, seed=1)
+
+    for student in room.students:
+        state = student.load()
+        assert state["practice_index"] == 6
+        assert state["xp"] == 6 * 12 and state["streak"] == 6
+        assert "Streak Master" in state["badges"]
+        assert [h["prompt"] for h in state["history"]] == [p["text"] for p in state["practice_set"]]
+
+    room.simulate(0.0, seed=2)  # nothing left to play
+    assert all(len(s.history) == 6 for s in room.students)
+
+
+def test_simulate_wrong_answers_reset_the_streak():
+    room = _room()
+    room.assign_practice(["tip"], 4, seed=1)
+    room.simulate(0.0, seed=1)
+    state = room.students[0].load()
+    assert state["xp"] == 0 and state["streak"] == 0
+    assert [h["correct"] for h in state["history"]] == [False] * 4
+
+
+def test_summary_never_fetches_history():
+    store = MemoryStore()
+    room = _room(store)
+    room.assign_practice(["tax"], 3, seed=1)
+    room.simulate(1.0, seed=1)
+
+    requested = []
+    original_load = store.load
+    store.load = lambda sid, keys=None: requested.append(keys) or original_load(sid, keys)
+    rows = list(room.summary())
+
+    assert [r["Done"] for r in rows] == ["3/3"] * 5 and rows[0]["XP"] == 36
+    assert requested and all(keys is not None and "history" not in keys for keys in requested)
+
+
+def test_500_student_roster_loads_in_under_a_second(tmp_path):
+    roster = "student_id,name\n" + "".join(f"{i},Student {i}\n" for i in range(500))
+    store = SQLiteStore(str(tmp_path / "class.db"))
+
+    start = time.perf_counter()
+    room = Classroom.from_csv(roster, "period1", store, owner="teacher")
+    room.assign_practice(["tax", "tip"], 10, seed=1)
+    rows = list(room.summary())
+    elapsed = time.perf_counter() - start
+
+    assert len(rows) == 500
+    assert elapsed < 1.0, f"500-student import + assign + summary took {elapsed:.2f}s"
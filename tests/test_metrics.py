@@ -0,0 +1,117 @@
+import socket
+import threading
+import urllib.error
+import urllib.request
+import warnings
+
+import pytest
+
+import metrics
+from metrics import Counter, Histogram, Registry
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    monkeypatch.setattr(metrics, "_server", None)
+    monkeypatch.setattr(metrics, "_server_failed", False)
+    server = metrics.start_metrics_server(0, "127.0.0.1")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _scrape(server, path="/metrics"):
+    with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}{path}") as resp:
+        assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        return resp.read().decode("utf-8")
+
+
+def _samples(body):
+    samples = {}
+    for line in body.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_scrape_sums_threads_and_buckets_are_cumulative(exporter):
+    def work():
+        for i in range(250):
+            metrics.RERUNS.inc(page="scrape-test")
+            metrics.DRX_SECONDS.observe(0.02 if i % 2 else 3.0)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    samples = _samples(_scrape(exporter))
+    assert samples['mathcraft_reruns_total{page="scrape-test"}'] == 1000
+
+    buckets = [(k, v) for k, v in samples.items() if k.startswith("mathcraft_drx_request_seconds_bucket")]
+    counts = [v for _, v in buckets]
+    assert counts == sorted(counts)  # cumulative, never decreasing
+    assert samples['mathcraft_drx_request_seconds_bucket{le="0.025"}'] >= 500
+    assert samples['mathcraft_drx_request_seconds_bucket{le="2.5"}'] == samples['mathcraft_drx_request_seconds_bucket{le="0.025"}']
+    assert samples['mathcraft_drx_request_seconds_bucket{le="+Inf"}'] == samples["mathcraft_drx_request_seconds_count"]
+    assert samples["mathcraft_drx_request_seconds_count"] >= 1000
+
+
+def test_unknown_path_is_404(exporter):
+    with pytest.raises(urllib.error.HTTPError) as err:
+        _scrape(exporter, "/")
+    assert err.value.code == 404
+
+
+def test_busy_port_warns_once_and_does_not_raise(exporter, monkeypatch):
+    port = exporter.server_address[1]
+    monkeypatch.setattr(metrics, "_server", None)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        assert metrics.start_metrics_server(port, "127.0.0.1") is None
+        assert metrics.start_metrics_server(port, "127.0.0.1") is None
+    assert len(caught) == 1
+
+
+def test_each_worker_index_gets_its_own_port(monkeypatch):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        free_port = probe.getsockname()[1]
+    monkeypatch.setattr(metrics, "_server", None)
+    monkeypatch.setattr(metrics, "_server_failed", False)
+    monkeypatch.setenv("MATHCRAFT_METRICS_PORT", str(free_port - 2))
+    monkeypatch.setenv("MATHCRAFT_WORKER_INDEX", "2")
+
+    server = metrics.start_metrics_server(host="127.0.0.1")
+    try:
+        assert server.server_address[1] == free_port
+        assert "# TYPE mathcraft_reruns_total counter" in _scrape(server)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_no_port_configured_means_no_exporter(monkeypatch):
+    monkeypatch.setattr(metrics, "_server", None)
+    monkeypatch.delenv("MATHCRAFT_METRICS_PORT", raising=False)
+    assert metrics.start_metrics_server() is None
+
+
+def test_dead_thread_shards_are_retired_without_scraping():
+    registry = Registry()
+    counter = Counter("test_total", "Test counter.", registry=registry)
+    for _ in range(50):
+        t = threading.Thread(target=counter.inc, kwargs={"kind": "a"})
+        t.start()
+        t.join()
+    assert len(registry._shards) <= 1
+    assert 'test_total{kind="a"} 50' in registry.render()
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    Histogram("test_seconds", "Test histogram.", buckets=(1,), registry=registry).observe(0.5, page='a "b"\n')
+    body = registry.render()
+    assert 'test_seconds_bucket{page="a \\"b\\"\\n",le="1"} 1' in body
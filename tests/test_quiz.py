@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+@pytest.fixture
+def quiz():
+    at = AppTest.from_file(APP, default_timeout=60).run()
+    return at.selectbox(key="nav_page").set_value("🧠 Quiz: The Percent Power-Up").run()
+
+
+def _quiz_history(at):
+    return [h for h in at.session_state["history"] if h["module"] == "Quiz"]
+
+
+def test_answers_and_bonus_are_recorded_once_across_reruns(quiz):
+    quiz.radio(key="qq1").set_value("0.75").run()
+    quiz.text_input(key="qq2").input("60").run()
+    quiz.radio(key="qq3").set_value("20%").run()
+    for _ in range(3):
+        quiz.run()
+
+    assert quiz.session_state["xp"] == 3 * 6 + 10
+    assert [h["prompt"] for h in _quiz_history(quiz)] == [
+        "75% → decimal", "30% of 200", "Percent discount from 50→40", "Quiz Perfect",
+    ]
+
+
+def test_switching_back_to_a_correct_answer_pays_no_more_xp(quiz):
+    quiz.radio(key="qq1").set_value("0.75").run()
+    quiz.radio(key="qq1").set_value("7.5").run()
+    quiz.radio(key="qq1").set_value("0.75").run()
+
+    assert quiz.session_state["xp"] == 6
+    assert [h["correct"] for h in _quiz_history(quiz)] == [True, False, True]
@@ -0,0 +1,116 @@
+import struct
+from unittest import mock
+
+import pytest
+
+import replay
+from replay import APP_STATE_KEYS, ReplayLog, log_widget_changes, read_log
+
+
+def _log(tmp_path, seed=1234):
+    return ReplayLog(str(tmp_path / "session.mcr"), seed)
+
+
+@pytest.mark.parametrize("value", [
+    None, True, False, 0, -2**40, 3.25, "", "héllo 🎨", "x" * 70_000, ["a", 1, 2.5, None, ["nested"]],
+])
+def test_widget_values_round_trip(tmp_path, value):
+    log = _log(tmp_path)
+    log.rerun()
+    log.widget("drx_final", value)
+    seed, reruns = read_log(log.path)
+    assert seed == 1234
+    assert reruns[0]["changes"] == [("drx_final", value)]
+
+
+def test_records_group_by_rerun(tmp_path):
+    log = _log(tmp_path)
+    log.rerun(); log.widget("nav_page", "🏠"); log.problem("Word Problems", "What is 5% of 40?", 2.0); log.rerun_end(12.5)
+    log.rerun()
+    _, reruns = read_log(log.path)
+    assert reruns[0]["problems"] == [("Word Problems", "What is 5% of 40?", 2.0)]
+    assert reruns[0]["elapsed_ms"] == 12.5
+    assert reruns[1] == {"started": reruns[1]["started"], "changes": [], "problems": [], "elapsed_ms": None}
+
+
+def test_reopening_appends_without_a_second_header(tmp_path):
+    _log(tmp_path).rerun()
+    _log(tmp_path, seed=99).rerun()
+    seed, reruns = read_log(str(tmp_path / "session.mcr"))
+    assert seed == 1234 and len(reruns) == 2
+
+
+def test_read_log_rejects_bad_magic(tmp_path):
+    path = tmp_path / "bad.mcr"
+    path.write_bytes(b"NOPE" + struct.pack("<BI", replay.VERSION, 1))
+    with pytest.raises(ValueError, match="not a MathCraft replay log"):
+        read_log(str(path))
+
+
+def test_read_log_rejects_other_versions(tmp_path):
+    path = tmp_path / "old.mcr"
+    path.write_bytes(replay.MAGIC + struct.pack("<BI", 1, 1))
+    with pytest.raises(ValueError, match="Unsupported replay log version 1"):
+        read_log(str(path))
+
+
+def test_read_log_rejects_unknown_record_types(tmp_path):
+    log = _log(tmp_path)
+    log.rerun()
+    with open(log.path, "ab") as f:
+        f.write(b"\x09")
+    with pytest.raises(ValueError, match="Unknown record type 9"):
+        read_log(log.path)
+
+
+def test_log_widget_changes_skips_app_state_and_unencodable_values(tmp_path):
+    log = _log(tmp_path)
+    log.rerun()
+    state = {"nav_page": "🏠", "wp_topic": "tax", "ms": ("a", "b"), "upload": object(), "xp": 10, "history": []}
+    snapshot = {}
+    log_widget_changes(log, state, snapshot)
+    state["wp_topic"] = "tip"
+    log_widget_changes(log, state, snapshot)
+
+    _, reruns = read_log(log.path)
+    assert reruns[0]["changes"] == [("nav_page", "🏠"), ("wp_topic", "tax"), ("ms", ["a", "b"]), ("wp_topic", "tip")]
+    assert {"xp", "history", "rng", "_store_snapshot"} <= APP_STATE_KEYS
+
+
+def test_repeated_button_clicks_are_each_logged(tmp_path):
+    log = _log(tmp_path)
+    snapshot = {}
+    for _ in range(2):
+        log.rerun()
+        log_widget_changes(log, {"wp_generate": True}, snapshot)
+    _, reruns = read_log(log.path)
+    assert [r["changes"] for r in reruns] == [[("wp_generate", True)], [("wp_generate", True)]]
+
+
+class _Reply:
+    status_code = 200
+
+    def json(self):
+        return {"reply": "Let's go!"}
+
+
+def test_replay_reproduces_a_recorded_session(tmp_path, monkeypatch):
+    AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+    monkeypatch.setenv("MATHCRAFT_REPLAY_DIR", str(tmp_path))
+    with mock.patch("requests.post", return_value=_Reply()):
+        at = AppTest.from_file(replay.__file__.replace("replay.py", "app.py"), default_timeout=60).run()
+        at.selectbox(key="nav_page").set_value("🧩 Word Problem Generator").run()
+        at.button(key="wp_generate").click().run()
+        at.button(key="wp_generate").click().run()
+        at.selectbox(key="nav_page").set_value("🤖 Design Your Own Percent Problem (Dr. X)").run()
+        at.text_area(key="drx_starter").set_value("Sneakers are 25% off").run()
+        at.button(key="drx_brainstorm").click().run()
+    log_path = tmp_path / f"{at.session_state['replay_id']}.mcr"
+
+    with mock.patch("requests.sessions.Session.request") as live_request:
+        rows = replay.replay_session(str(log_path))
+    live_request.assert_not_called()  # the replayed Dr. X click must not reach the network
+
+    assert len(rows) == 7
+    assert all(r["problems_match"] and not r["exception"] for r in rows)
+    assert replay.replay_dir() == str(tmp_path)  # restored after the replay
@@ -0,0 +1,172 @@
+import random
+import threading
+
+import pytest
+
+from session_store import MemoryStore, RedisStore, SQLiteStore, decode, encode, sync_in, sync_out
+
+
+@pytest.mark.parametrize("value", [
+    None, True, False, 0, -7, 2**62, 1.5, "", "héllo 🎨",
+    [1, "a", None], (5, 20.0), {"b", "a"}, {"x": 1.5, "ok": True, 3: [("You", "hi")]},
+    [{"time": "t", "correct": False, "xp": 12}],
+])
+def test_codec_round_trips(value):
+    assert decode(encode(value)) == value
+    assert type(decode(encode(value))) is type(value)
+
+
+def test_equal_sets_encode_identically():
+    assert encode({"b", "a", "c"}) == encode({"c", "a", "b"})
+
+
+def test_codec_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        encode(object())
+
+
+class FakeRedis:
+    """In-process stand-in for redis.Redis: bytes keys and values, like the real client returns."""
+
+    def __init__(self):
+        self.data = {}
+
+    @staticmethod
+    def _b(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def incr(self, key):
+        self.data[key] = self._b(int(self.data.get(key, b"0")) + 1)
+        return int(self.data[key])
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update({self._b(k): v for k, v in mapping.items()})
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def hmget(self, key, fields):
+        stored = self.data.get(key, {})
+        return [stored.get(self._b(f)) for f in fields]
+
+
+class FakePipelinedRedis(FakeRedis):
+    def pipeline(self):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client, self.calls = client, []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis", "redis-no-pipeline"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStore()
+    if request.param == "sqlite":
+        return SQLiteStore(str(tmp_path / "sessions.db"))
+    # Plain FakeRedis has no pipeline(), which exercises RedisStore's unpipelined branch.
+    return RedisStore(FakePipelinedRedis() if request.param == "redis" else FakeRedis())
+
+
+def _state():
+    return {"xp": 5, "streak": 1, "badges": {"Percent Apprentice"}, "history": [], "rng": random.Random(3), "nav_page": "🏠"}
+
+
+def test_sync_out_writes_only_dirty_keys(store):
+    state = _state()
+    sync_out(store, state, "s1")
+    version = store.version("s1")
+    assert set(store.load("s1")) == {"xp", "streak", "badges", "history", "rng"}  # widget keys stay local
+
+    sync_out(store, state, "s1")
+    assert store.version("s1") == version  # nothing changed, nothing written
+
+    state["history"].append({"module": "Quiz", "correct": True})
+    saved = []
+    original_save = store.save
+    store.save = lambda sid, changes: saved.append(set(changes)) or original_save(sid, changes)
+    sync_out(store, state, "s1")
+    assert saved == [{"history"}]
+    assert store.version("s1") == version + 1
+
+
+def test_sync_in_restores_state_on_another_worker(store):
+    state = _state()
+    sync_out(store, state, "s1")
+
+    other = {}
+    sync_in(store, other, "s1")
+    assert other["xp"] == 5 and other["badges"] == {"Percent Apprentice"}
+    assert other["rng"].random() == random.Random(3).random()
+
+
+def test_sync_in_skips_reload_when_version_is_current(store):
+    state = _state()
+    sync_out(store, state, "s1")
+    state["xp"] = 999  # local-only change, not yet synced out
+    sync_in(store, state, "s1")
+    assert state["xp"] == 999
+
+
+def test_load_fetches_only_the_requested_keys(store):
+    store.save("s1", {"xp": encode(3), "history": encode([1, 2, 3]), "streak": encode(0)})
+    assert store.load("s1", ["xp", "streak", "missing"]) == {"xp": encode(3), "streak": encode(0)}
+    assert store.load("s1", []) == {}
+    assert set(store.load("s1")) == {"xp", "history", "streak"}
+
+
+def test_save_many_bumps_every_session(store):
+    store.save_many({"a": {"xp": encode(1)}, "b": {"xp": encode(2)}})
+    store.save_many({"a": {"xp": encode(3)}})
+    assert (store.version("a"), store.version("b")) == (2, 1)
+    assert decode(store.load("a")["xp"]) == 3
+
+
+def test_sqlite_store_is_shared_across_threads(tmp_path):
+    store = SQLiteStore(str(tmp_path / "sessions.db"))
+
+    def work(n):
+        for i in range(20):
+            store.save(f"s{n}", {"xp": encode(i)})
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(store.version(f"s{n}") == 20 for n in range(8))
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_store_evicts_abandoned_sessions():
+    clock = _Clock()
+    store = MemoryStore(ttl=60, clock=clock)
+    store.save("abandoned", {"history": encode([{"module": "Quiz"}] * 100)})
+    store.save("active", {"xp": encode(1)})
+
+    for _ in range(3):
+        clock.now += 30
+        store.version("active")  # the active tab keeps rerunning
+    store.save("newcomer", {"xp": encode(0)})
+
+    assert store.load("abandoned") == {} and store.version("abandoned") == 0
+    assert decode(store.load("active")["xp"]) == 1
+    assert set(store._data) == {"active", "newcomer"}
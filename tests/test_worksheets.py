@@ -0,0 +1,63 @@
+import io
+import random
+import re
+
+import pytest
+
+import worksheets
+from problems import WORD_PROBLEM_TOPICS, generate_word_problem
+
+
+def test_word_problems_are_deterministic_for_a_seed():
+    def batch(seed):
+        rng = random.Random(seed)
+        return [generate_word_problem(rng.choice(WORD_PROBLEM_TOPICS), rng) for _ in range(50)]
+
+    assert batch(7) == batch(7)
+    assert batch(7) != batch(8)
+
+
+@pytest.fixture
+def counted_renders(monkeypatch):
+    calls = []
+
+    def fake_render(kind, pct):
+        calls.append((kind, pct))
+        return f"{kind}:{pct}".encode(), 0.0
+
+    monkeypatch.setattr(worksheets, "_figure_cache", {})
+    monkeypatch.setattr(worksheets, "render_figure_timed", fake_render)
+    return calls
+
+
+def test_render_figures_reuses_cached_bytes(counted_renders):
+    first = worksheets.render_figures({("grid", 5.0), ("grid", 25.0)}, max_workers=1)
+    again = worksheets.render_figures({("grid", 5.0), ("bar", 5.0)}, max_workers=1)
+
+    assert sorted(counted_renders) == [("bar", 5.0), ("grid", 5.0), ("grid", 25.0)]
+    assert again[("grid", 5.0)] == first[("grid", 5.0)] == b"grid:5.0"
+
+
+def test_html_defines_every_figure_class_it_uses(counted_renders):
+    # Tax percents are floats and commission/percent_of percents are ints; both must resolve.
+    rng = random.Random(3)
+    problems = []
+    for _ in range(200):
+        prob = generate_word_problem(rng.choice(["tax", "commission", "percent_of"]), rng)
+        prob["figure"] = ("grid", float(prob["pct"]))
+        problems.append(prob)
+    images = worksheets.render_figures({p["figure"] for p in problems}, max_workers=1)
+
+    out = io.BytesIO()
+    worksheets._write_html(out, "Practice", problems, images)
+    doc = out.getvalue().decode("utf-8")
+
+    defined = set(re.findall(r"\.(fig-grid-[\w]+)\{", doc))
+    used = set(re.findall(r"class='fig (fig-grid-[\w]+)'", doc))
+    assert used and used <= defined
+    assert "Answer Key" in doc
+
+
+def test_small_pdf_build():
+    with worksheets.build_worksheet(["tip", "tax"], 6, visual="bar", fmt="pdf", max_workers=1) as doc:
+        assert doc.read(5) == b"%PDF-"
@@ -0,0 +1,140 @@
+import base64
+import html
+import io
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from figures import render_figure_timed
+from metrics import FIGURE_SECONDS
+from problems import generate_word_problem
+
+# -------------------------------
+# Worksheet + answer-key renderer (HTML or PDF)
+# -------------------------------
+PROBLEMS_PER_PAGE = 4
+SPOOL_MAX_BYTES = 8 * 1024 * 1024  # spill the document to disk past this size
+
+_figure_cache = {}  # (kind, pct) -> PNG bytes, shared across builds in this process
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _figure_pool(size):
+    """
+    One render pool per process, created on first use with at most `size` workers. Workers
+    start via forkserver (spawn where unavailable): forking Streamlit's multi-threaded
+    server can deadlock.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=size, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+def render_figures(keys, max_workers=None):
+    """
+    Returns {(kind, pct): PNG bytes} for every key. Percents already rendered come from
+    the cache; the rest are drawn in parallel with a shared process pool.
+    """
+    missing = sorted(k for k in set(keys) if k not in _figure_cache)
+    if len(missing) == 1 or max_workers == 1:
+        results = [render_figure_timed(kind, pct) for kind, pct in missing]
+    elif missing:
+        size = min(max_workers or os.cpu_count() or 1, len(missing))
+        kinds, pcts = zip(*missing)
+        results = list(_figure_pool(size).map(render_figure_timed, kinds, pcts))
+    else:
+        results = []
+    for (kind, pct), (png, seconds) in zip(missing, results):
+        _figure_cache[(kind, pct)] = png
+        FIGURE_SECONDS.observe(seconds, kind=kind)
+    return {k: _figure_cache[k] for k in keys}
+
+def _pages(problems):
+    for start in range(0, len(problems), PROBLEMS_PER_PAGE):
+        yield [(start + i + 1, p) for i, p in enumerate(problems[start:start + PROBLEMS_PER_PAGE])]
+
+def _css_class(key):
+    kind, pct = key
+    return f"fig-{kind}-{pct:g}".replace(".", "_")
+
+def _write_html(out, title, problems, images):
+    # Each distinct figure is embedded once as a CSS class, so repeated percents cost nothing.
+    w = lambda s: out.write(s.encode("utf-8"))
+    w("<!DOCTYPE html><html><head><meta charset='utf-8'>")
+    w(f"<title>{html.escape(title)}</title><style>")
+    w("body{font-family:Roboto,sans-serif;color:#333}"
+      ".page{page-break-after:always;padding:1rem}"
+      ".problem{display:flex;gap:1rem;align-items:center;margin:1.2rem 0}"
+      ".fig{width:180px;height:180px;background:no-repeat center/contain;"
+      "-webkit-print-color-adjust:exact;print-color-adjust:exact}"
+      ".fig-bar{height:40px}")
+    for key, png in images.items():
+        w(f".{_css_class(key)}{{background-image:url(data:image/png;base64,{base64.b64encode(png).decode('ascii')})}}")
+    w("</style></head><body>")
+    page_count = 0
+    for page in _pages(problems):
+        page_count += 1
+        w(f"<section class='page'><h2>{html.escape(title)} — Page {page_count}</h2>")
+        w("<p>Name: ____________________ &nbsp; Date: __________</p>")
+        for n, prob in page:
+            key = prob["figure"]
+            bar = " fig-bar" if key[0] == "bar" else ""
+            w(f"<div class='problem'><div class='fig{bar} {_css_class(key)}'></div>"
+              f"<p><b>{n}.</b> {html.escape(prob['text'])}<br><br>Answer: ______________</p></div>")
+        w("</section>")
+    w(f"<section class='page'><h2>{html.escape(title)} — Answer Key</h2><ol>")
+    for prob in problems:
+        w(f"<li>{html.escape(prob['text'])} <b>{prob['answer']:.2f}</b></li>")
+    w("</ol></section></body></html>")
+
+def _write_pdf(out, title, problems, images):
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    decoded = {k: plt.imread(io.BytesIO(png), format="png") for k, png in images.items()}
+    slot = 1 / PROBLEMS_PER_PAGE * 0.9
+    with PdfPages(out) as pdf:  # pages are written to `out` as they are saved
+        for page_no, page in enumerate(_pages(problems), 1):
+            fig = plt.figure(figsize=(8.5, 11))
+            fig.text(0.08, 0.95, f"{title} — Page {page_no}", fontsize=16, weight="bold")
+            fig.text(0.08, 0.925, "Name: ____________________   Date: __________", fontsize=10)
+            for i, (n, prob) in enumerate(page):
+                top = 0.9 - i * slot
+                ax = fig.add_axes([0.06, top - slot * 0.9, 0.3, slot * 0.85])
+                ax.imshow(decoded[prob["figure"]]); ax.axis("off")
+                fig.text(0.4, top - slot * 0.3, f"{n}. {prob['text']}", fontsize=10, wrap=True)
+                fig.text(0.4, top - slot * 0.6, "Answer: ______________", fontsize=10)
+            pdf.savefig(fig); plt.close(fig)
+        per_key_page = 40
+        for start in range(0, len(problems), per_key_page):
+            fig = plt.figure(figsize=(8.5, 11))
+            fig.text(0.08, 0.95, f"{title} — Answer Key", fontsize=16, weight="bold")
+            for i, prob in enumerate(problems[start:start + per_key_page]):
+                fig.text(0.08, 0.91 - i * 0.021, f"{start + i + 1}. {prob['answer']:.2f}", fontsize=10)
+            pdf.savefig(fig); plt.close(fig)
+
+WRITERS = {"html": _write_html, "pdf": _write_pdf}
+
+def build_worksheet(topics, count, visual="grid", fmt="html", title="Percent Practice", rng=random, max_workers=None):
+    """
+    Generates `count` word problems from `topics`, renders one `visual` ("grid" or "bar")
+    per problem plus an answer key, and returns the document as a rewound file object.
+    Pages are written incrementally to a spooled temp file (spilling to disk when large)
+    rather than assembled as one string; callers read it once to hand it to the download.
+    """
+    problems = []
+    for _ in range(count):
+        prob = generate_word_problem(rng.choice(topics), rng)
+        prob["figure"] = (visual, float(prob["pct"]))  # 5 and 5.0 must share one figure and class
+        problems.append(prob)
+    images = render_figures({p["figure"] for p in problems}, max_workers=max_workers)
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    WRITERS[fmt](out, title, problems, images)
+    out.seek(0)
+    return out